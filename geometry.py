@@ -0,0 +1,388 @@
+"""
+Geometría de rutas vectorizada con NumPy
+Convierte las coordenadas de route_coordinates en arreglos de segmentos
+proyectados a metros para calcular distancias punto-segmento en lote
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Cantidad de pares punto-segmento que se evalúan a la vez en los análisis
+MAX_CANDIDATE_PAIRS = 2000000
+
+GEOMETRY_QUERY = """
+SELECT
+    rc.route_id,
+    rc.latitude::float8,
+    rc.longitude::float8
+FROM route_coordinates rc
+JOIN routes r ON r.id = rc.route_id
+WHERE r.is_active = TRUE
+{route_filter}
+ORDER BY rc.route_id, rc.sequence_order
+"""
+
+
+def group_starts(groups):
+    """Índices donde empieza cada grupo en un arreglo ordenado por grupo"""
+    groups = np.asarray(groups)
+    if not len(groups):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+
+def to_local_xy(lats, lngs, origin_lat):
+    """Proyectar lat/lng a metros con una proyección equirectangular local"""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+    x = EARTH_RADIUS_M * lngs * np.cos(np.radians(origin_lat))
+    y = EARTH_RADIUS_M * lats
+    return np.stack([x, y], axis=-1)
+
+
+def from_local_xy(xy, origin_lat):
+    """Convertir metros de la proyección local de vuelta a lat/lng"""
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    lngs = np.degrees(xy[:, 0] / (EARTH_RADIUS_M * np.cos(np.radians(origin_lat))))
+    lats = np.degrees(xy[:, 1] / EARTH_RADIUS_M)
+    return lats, lngs
+
+
+def expand_ranges(count):
+    """Índice de grupo y posición local para grupos de tamaño ``count`` concatenados"""
+    count = np.asarray(count, dtype=np.int64)
+    group = np.repeat(np.arange(len(count)), count)
+    local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    return group, local
+
+
+class RouteGeometry:
+    """Segmentos de todas las rutas en arreglos contiguos, agrupados por ruta"""
+
+    def __init__(self, route_ids, seg_route, start, end, offset, origin_lat):
+        self.route_ids = route_ids      # (R,) id de cada ruta
+        self.seg_route = seg_route      # (S,) índice en route_ids de cada segmento
+        self.start = start              # (S, 2) inicio del segmento en metros
+        self.end = end                  # (S, 2) fin del segmento en metros
+        self.offset = offset            # (S,) distancia recorrida al inicio del segmento
+        self.origin_lat = origin_lat
+
+        self.vector = end - start
+        self.length = np.hypot(self.vector[:, 0], self.vector[:, 1])
+        self.route_starts = group_starts(seg_route)
+
+    @classmethod
+    def from_rows(cls, rows, origin_lat=None):
+        """Construir desde filas (route_id, lat, lng) ordenadas por ruta y secuencia"""
+        points = np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+        if origin_lat is None:
+            origin_lat = float(points[:, 1].mean()) if len(points) else 0.0
+
+        point_route = points[:, 0].astype(np.int64)
+        xy = to_local_xy(points[:, 1], points[:, 2], origin_lat)
+
+        # Un segmento une cada punto con el siguiente de la misma ruta
+        same_route = point_route[1:] == point_route[:-1]
+        start = xy[:-1][same_route]
+        end = xy[1:][same_route]
+        seg_route_ids = point_route[:-1][same_route]
+
+        route_ids, seg_route = np.unique(seg_route_ids, return_inverse=True)
+        seg_route = seg_route.reshape(-1)
+
+        # Distancia recorrida desde el inicio de la ruta hasta cada segmento
+        length = np.hypot(end[:, 0] - start[:, 0], end[:, 1] - start[:, 1])
+        cumulative = np.cumsum(length) - length
+        offset = cumulative - cumulative[group_starts(seg_route)][seg_route]
+
+        return cls(route_ids, seg_route, start, end, offset, origin_lat)
+
+    @classmethod
+    def load(cls, cursor, route_ids=None):
+        """Cargar la geometría de las rutas activas en una sola consulta"""
+        if route_ids is not None:
+            cursor.execute(GEOMETRY_QUERY.format(route_filter='AND rc.route_id = ANY(%s)'), (list(route_ids),))
+        else:
+            cursor.execute(GEOMETRY_QUERY.format(route_filter=''))
+        return cls.from_rows(cursor.fetchall())
+
+    @property
+    def route_lengths(self):
+        """Longitud total de cada ruta en metros"""
+        if not len(self.length):
+            return np.empty(0)
+        return np.add.reduceat(self.length, self.route_starts)
+
+    @property
+    def route_bounds(self):
+        """Caja envolvente (R, 4) de cada ruta: x mínimo, y mínimo, x máximo, y máximo"""
+        if not len(self.length):
+            return np.empty((0, 4))
+        low = np.minimum.reduceat(np.minimum(self.start, self.end), self.route_starts)
+        high = np.maximum.reduceat(np.maximum(self.start, self.end), self.route_starts)
+        return np.hstack([low, high])
+
+    def sample(self, spacing, route_mask=None):
+        """Muestrear puntos a lo largo de las rutas cada ``spacing`` metros como máximo
+
+        Devuelve las posiciones (N, 2), el índice de ruta y la longitud de ruta
+        que representa cada muestra
+        """
+        segments = np.arange(len(self.length))
+        if route_mask is not None:
+            segments = segments[route_mask[self.seg_route]]
+
+        count = np.maximum(np.ceil(self.length[segments] / spacing), 1).astype(np.int64)
+        group, local = expand_ranges(count)
+        segments = segments[group]
+        fraction = (local + 0.5) / count[group]
+
+        xy = self.start[segments] + fraction[:, None] * self.vector[segments]
+        weight = self.length[segments] / count[group]
+        return xy, self.seg_route[segments], weight
+
+    def project_pairs(self, xy, segments):
+        """Proyectar cada punto xy[i] sobre el segmento segments[i]
+
+        Devuelve la distancia al segmento y la fracción t del segmento donde
+        cae la proyección
+        """
+        vector = self.vector[segments]
+        diff = xy - self.start[segments]
+        t = np.einsum('ik,ik->i', diff, vector) / np.maximum(self.length[segments] ** 2, 1e-12)
+        np.clip(t, 0.0, 1.0, out=t)
+        diff -= t[:, None] * vector
+        return np.hypot(diff[:, 0], diff[:, 1]), t
+
+
+class SegmentGrid:
+    """Índice espacial de segmentos en una grilla uniforme
+
+    Cada segmento se registra en todas las celdas que toca su caja envolvente
+    ampliada en ``radius``, así un punto solo necesita consultar su propia
+    celda para obtener todos los segmentos que podrían estar a esa distancia
+    """
+
+    def __init__(self, geometry, radius, cell_size=None, segment_mask=None):
+        self.radius = float(radius)
+        if cell_size is None:
+            typical = float(np.median(geometry.length)) if len(geometry.length) else 0.0
+            cell_size = max(self.radius, typical, 1.0)
+        self.cell_size = float(cell_size)
+
+        indexed = np.arange(len(geometry.length))
+        if segment_mask is not None:
+            indexed = indexed[segment_mask]
+
+        low = np.minimum(geometry.start[indexed], geometry.end[indexed]) - self.radius
+        high = np.maximum(geometry.start[indexed], geometry.end[indexed]) + self.radius
+        cell_low = np.floor(low / self.cell_size).astype(np.int64)
+        cell_high = np.floor(high / self.cell_size).astype(np.int64)
+
+        if len(cell_low):
+            self.grid_min = cell_low.min(axis=0)
+            self.grid_shape = cell_high.max(axis=0) - self.grid_min + 1
+        else:
+            self.grid_min = np.zeros(2, dtype=np.int64)
+            self.grid_shape = np.zeros(2, dtype=np.int64)
+
+        # Expandir cada segmento a la lista de celdas que cubre
+        span = cell_high - cell_low + 1
+        segments, local = expand_ranges(span[:, 0] * span[:, 1])
+        cell_x = cell_low[segments, 0] + local % span[segments, 0]
+        cell_y = cell_low[segments, 1] + local // span[segments, 0]
+
+        keys = self._keys(cell_x, cell_y)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.segments = indexed[segments[order]]
+
+    @classmethod
+    def from_arrays(cls, radius, cell_size, keys, segments, grid_min, grid_shape):
+        """Reconstruir un índice ya calculado (por ejemplo desde un snapshot)"""
+        grid = cls.__new__(cls)
+        grid.radius = float(radius)
+        grid.cell_size = float(cell_size)
+        grid.keys = keys
+        grid.segments = segments
+        grid.grid_min = grid_min
+        grid.grid_shape = grid_shape
+        return grid
+
+    def _keys(self, cell_x, cell_y):
+        return (cell_x - self.grid_min[0]) * self.grid_shape[1] + (cell_y - self.grid_min[1])
+
+    def _ranges(self, xy):
+        cells = np.floor(xy / self.cell_size).astype(np.int64) - self.grid_min
+        inside = np.all((cells >= 0) & (cells < self.grid_shape), axis=1)
+
+        keys = self._keys(cells[:, 0] + self.grid_min[0], cells[:, 1] + self.grid_min[1])
+        left = np.searchsorted(self.keys, keys, side='left')
+        right = np.searchsorted(self.keys, keys, side='right')
+        return left, np.where(inside, right - left, 0)
+
+    def candidates(self, xy):
+        """Pares (índice de punto, índice de segmento) que comparten celda"""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        left, count = self._ranges(xy)
+        points, local = expand_ranges(count)
+        return points, self.segments[np.repeat(left, count) + local]
+
+    def iter_candidates(self, xy, max_pairs=MAX_CANDIDATE_PAIRS):
+        """Igual que candidates, pero en bloques de a lo sumo ~``max_pairs`` pares"""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        left, count = self._ranges(xy)
+        block = np.cumsum(count) // max_pairs
+        bounds = np.r_[0, np.flatnonzero(block[1:] != block[:-1]) + 1, len(xy)]
+
+        for begin, stop in zip(bounds[:-1], bounds[1:]):
+            points, local = expand_ranges(count[begin:stop])
+            segments = self.segments[np.repeat(left[begin:stop], count[begin:stop]) + local]
+            yield points + begin, segments
+
+
+def match_points(geometry, lats, lngs, max_distance, grid=None, route_mask=None):
+    """Ajustar puntos GPS al segmento más cercano a menos de ``max_distance`` metros
+
+    ``route_mask`` (R,) limita las rutas candidatas sin reconstruir el índice.
+    Devuelve por punto el índice de ruta (-1 si no hay coincidencia), la
+    distancia a la ruta y la distancia recorrida sobre la ruta
+    """
+    n_points = len(lats)
+    route_index = np.full(n_points, -1, dtype=np.int64)
+    distance_to_route = np.full(n_points, np.nan)
+    distance_along = np.full(n_points, np.nan)
+
+    if not n_points or not len(geometry.length):
+        return route_index, distance_to_route, distance_along
+
+    if grid is None or grid.radius < max_distance:
+        grid = SegmentGrid(geometry, max_distance)
+
+    xy = to_local_xy(lats, lngs, geometry.origin_lat)
+    points, segments = grid.candidates(xy)
+    if route_mask is not None:
+        allowed = route_mask[geometry.seg_route[segments]]
+        points, segments = points[allowed], segments[allowed]
+    distance, t = geometry.project_pairs(xy[points], segments)
+
+    close = distance <= max_distance
+    points, segments, distance, t = points[close], segments[close], distance[close], t[close]
+
+    # Quedarse con el par más cercano de cada punto
+    order = np.lexsort((distance, points))
+    points, first = np.unique(points[order], return_index=True)
+    best = order[first]
+    segments = segments[best]
+
+    route_index[points] = geometry.seg_route[segments]
+    distance_to_route[points] = distance[best]
+    distance_along[points] = geometry.offset[segments] + t[best] * geometry.length[segments]
+
+    return route_index, distance_to_route, distance_along
+
+
+def bbox_pairs(bounds, margin=0.0):
+    """Pares (i, j), i < j, de cajas que se intersectan a menos de ``margin``
+
+    Barrido ordenado por x mínimo: cada caja solo se compara con las que
+    empiezan antes de que ella termine, en lugar de comparar todas contra todas
+    """
+    if not len(bounds):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    order = np.argsort(bounds[:, 0], kind='stable')
+    sorted_bounds = bounds[order]
+    stop = np.searchsorted(sorted_bounds[:, 0], sorted_bounds[:, 2] + margin, side='right')
+    first, local = expand_ranges(np.maximum(stop - np.arange(len(order)) - 1, 0))
+    second = first + 1 + local
+
+    a, b = sorted_bounds[first], sorted_bounds[second]
+    overlap_y = (a[:, 1] <= b[:, 3] + margin) & (b[:, 1] <= a[:, 3] + margin)
+    first, second = order[first[overlap_y]], order[second[overlap_y]]
+    return np.minimum(first, second), np.maximum(first, second)
+
+
+def route_overlaps(geometry, tolerance, spacing=None):
+    """Longitud compartida entre pares de rutas a menos de ``tolerance`` metros
+
+    Devuelve los arreglos (i, j, compartido_i, compartido_j) donde
+    compartido_i es cuántos metros de la ruta i corren a menos de la
+    tolerancia de la ruta j, con i < j índices de geometry.route_ids
+    """
+    n_routes = len(geometry.route_ids)
+    empty = np.empty(0, dtype=np.int64)
+    if spacing is None:
+        spacing = tolerance / 2.0
+
+    first, second = bbox_pairs(geometry.route_bounds, tolerance)
+    if not len(first):
+        return empty, empty, np.empty(0), np.empty(0)
+
+    # Solo las rutas con algún vecino posible se muestrean e indexan
+    candidate = np.zeros(n_routes, dtype=bool)
+    candidate[first] = True
+    candidate[second] = True
+    pair_keys = np.unique(np.concatenate([first * n_routes + second, second * n_routes + first]))
+
+    grid = SegmentGrid(geometry, tolerance, cell_size=4 * tolerance, segment_mask=candidate[geometry.seg_route])
+    xy, sample_route, weight = geometry.sample(spacing, candidate)
+
+    found_keys = []
+    found_weights = []
+    for samples, segments in grid.iter_candidates(xy):
+        keys = sample_route[samples] * n_routes + geometry.seg_route[segments]
+        position = np.minimum(np.searchsorted(pair_keys, keys), len(pair_keys) - 1)
+        keep = pair_keys[position] == keys
+        samples, segments, keys = samples[keep], segments[keep], keys[keep]
+
+        distance, _ = geometry.project_pairs(xy[samples], segments)
+        close = distance <= tolerance
+
+        # Cada muestra cuenta una sola vez por ruta vecina
+        hits = np.unique(samples[close] * n_routes + keys[close] % n_routes)
+        found_keys.append(sample_route[hits // n_routes] * n_routes + hits % n_routes)
+        found_weights.append(weight[hits // n_routes])
+
+    if not found_keys:
+        return empty, empty, np.empty(0), np.empty(0)
+
+    # Acumular por par sin orden: la ruta menor en un lado, la mayor en el otro
+    keys = np.concatenate(found_keys)
+    weights = np.concatenate(found_weights)
+    route, other = keys // n_routes, keys % n_routes
+    low, high = np.minimum(route, other), np.maximum(route, other)
+    pairs, inverse = np.unique(low * n_routes + high, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    shared_low = np.bincount(inverse, weights=np.where(route == low, weights, 0.0), minlength=len(pairs))
+    shared_high = np.bincount(inverse, weights=np.where(route == high, weights, 0.0), minlength=len(pairs))
+
+    return pairs // n_routes, pairs % n_routes, shared_low, shared_high
+
+
+def corridor_counts(geometry, corridor_size, spacing=None):
+    """Rutas distintas que pasan por cada celda de ``corridor_size`` metros
+
+    Devuelve el centro de cada celda (N, 2), la cantidad de rutas por celda
+    y, para cada par (celda, ruta), el índice de celda y el índice de ruta
+    """
+    n_routes = len(geometry.route_ids)
+    if spacing is None:
+        spacing = corridor_size / 4.0
+
+    xy, sample_route, _ = geometry.sample(spacing)
+    cells = np.floor(xy / corridor_size).astype(np.int64)
+    if not len(cells):
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    cell_min = cells.min(axis=0)
+    cell_rows = cells[:, 1].max() - cell_min[1] + 1
+    cell_keys = (cells[:, 0] - cell_min[0]) * cell_rows + (cells[:, 1] - cell_min[1])
+
+    cell_route = np.unique(cell_keys * n_routes + sample_route)
+    keys, cell_of_pair, route_count = np.unique(cell_route // n_routes, return_inverse=True, return_counts=True)
+
+    centers = np.column_stack([keys // cell_rows + cell_min[0], keys % cell_rows + cell_min[1]])
+    centers = (centers + 0.5) * corridor_size
+    return centers, route_count, cell_of_pair.reshape(-1), cell_route % n_routes
@@ -2,10 +2,17 @@ from flask import Flask, jsonify, request
 from flask_cors import CORS
 import psycopg2
 from psycopg2 import sql, Error
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import json
 from datetime import datetime
 import os
+import threading
+import time
+from functools import wraps
+import numpy as np
+from geometry import RouteGeometry, SegmentGrid, match_points, route_overlaps, corridor_counts, from_local_xy
+from singleflight import SingleFlight
+from snapshot import fetch_db_version, load_snapshot, snapshot_lock, write_snapshot
 
 app = Flask(__name__)
 CORS(app)
@@ -19,6 +26,15 @@ DB_CONFIG = {
     'port': os.environ.get('DB_PORT', '5432')  # aquí sí puedes dejar default
 }
 
+# Snapshot opcional de rutas en disco para arrancar en caliente (ver snapshot.py)
+SNAPSHOT_PATH = os.environ.get('ROUTE_SNAPSHOT_PATH')
+SNAPSHOT_MAX_AGE = float(os.environ.get('ROUTE_SNAPSHOT_MAX_AGE', '5'))
+SNAPSHOT_GRID_RADIUS = 50
+
+# Geometría de rutas en memoria de cada proceso para POST /api/match
+GEOMETRY_CACHE_MAX_AGE = float(os.environ.get('GEOMETRY_CACHE_MAX_AGE', '5'))
+MATCH_GRID_RADII = (50, 100, 250, 500, 1000)
+
 
 class DatabaseConnection:
     def __init__(self):
@@ -40,47 +56,276 @@ def get_db_connection():
     db = DatabaseConnection()
     return db.connect()
 
+# Lecturas idénticas en curso (mismo endpoint y parámetros) comparten una sola consulta
+read_flights = SingleFlight()
+
+# Escrituras confirmadas en este proceso; forma parte de la clave de agrupación
+# para que una lectura posterior a una escritura no reciba una respuesta anterior
+write_lock = threading.Lock()
+write_generation = 0
+
+def record_write():
+    """Avanzar la generación de escrituras"""
+    global write_generation
+    with write_lock:
+        write_generation += 1
+
+def commit_write(connection):
+    """Confirmar una escritura e invalidar las lecturas agrupadas y las cachés
+
+    La generación avanza antes y después del commit: una lectura que empieza
+    mientras se confirma no se une a una iniciada antes de la escritura, y una
+    que empieza después no se une a una que pudo ver el estado anterior
+    """
+    record_write()
+    try:
+        connection.commit()
+    finally:
+        record_write()
+        route_cache.invalidate()
+        geometry_cache.invalidate()
+
+def coalesce_reads(view):
+    """Agrupar solicitudes GET idénticas concurrentes y compartir la respuesta serializada"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (write_generation, request.path, tuple(sorted(request.args.items(multi=True))))
+
+        def run():
+            response = app.make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, response.mimetype
+
+        body, status, mimetype = read_flights.do(view.__name__, key, run)
+        return app.response_class(body, status=status, mimetype=mimetype)
+
+    return wrapper
+
+def fetch_all_routes(cursor):
+    """Todas las rutas activas con sus coordenadas, ordenadas por nombre"""
+    # Usando la vista route_details que ya tienes creada
+    query = """
+    SELECT
+        id,
+        name,
+        description,
+        route_type,
+        is_active,
+        coordinates
+    FROM route_details
+    ORDER BY name
+    """
+
+    cursor.execute(query)
+    routes = cursor.fetchall()
+
+    # Convertir RealDictRow a diccionario normal
+    routes_list = []
+    for route in routes:
+        route_dict = dict(route)
+        # Las coordenadas ya vienen como JSON desde la vista
+        routes_list.append(route_dict)
+
+    return routes_list
+
+def all_routes_response(routes_list):
+    return jsonify({
+        'success': True,
+        'data': routes_list,
+        'total': len(routes_list)
+    })
+
+class RouteSnapshotCache:
+    """Respuesta de GET /api/routes, geometría e índice espacial listos para usar
+
+    Al arrancar se mapea el snapshot del disco sin consultar la base de datos;
+    la versión se verifica contra la base de datos como máximo cada
+    SNAPSHOT_MAX_AGE segundos y, si cambió, se reconstruye y se reescribe
+    """
+
+    def __init__(self, path, max_age):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.checked_at = 0.0
+
+    def warm_up(self):
+        """Cargar el snapshot del disco (no consulta la base de datos)"""
+        if self.path:
+            self.snapshot = load_snapshot(self.path)
+
+    def invalidate(self):
+        """Forzar la verificación de versión en el próximo uso"""
+        self.checked_at = 0.0
+
+    def _fresh(self):
+        return self.snapshot is not None and time.monotonic() - self.checked_at < self.max_age
+
+    def get(self):
+        """Snapshot vigente, o None si no está habilitado o no se pudo construir
+
+        Sin conexión a la base de datos se sigue sirviendo el snapshot ya
+        mapeado y se vuelve a intentar tras SNAPSHOT_MAX_AGE segundos
+        """
+        if not self.path:
+            return None
+        if self._fresh():
+            return self.snapshot
+
+        with self.lock:
+            if self._fresh():
+                return self.snapshot
+
+            connection = get_db_connection()
+            if not connection:
+                self.checked_at = time.monotonic()
+                return self.snapshot
+            try:
+                cursor = connection.cursor()
+                version = fetch_db_version(cursor)
+                if self.snapshot is None or self.snapshot['version'] != version:
+                    snapshot = self.load_current(version)
+                    if snapshot is None:
+                        # Un solo proceso reconstruye; los demás esperan y usan su archivo
+                        with snapshot_lock(self.path):
+                            version = fetch_db_version(cursor)
+                            snapshot = self.load_current(version) or self.build(connection, version)
+                    self.snapshot = snapshot
+                self.checked_at = time.monotonic()
+            finally:
+                connection.close()
+
+        return self.snapshot
+
+    def load_current(self, version):
+        """Snapshot del disco si corresponde a la versión dada (otro worker pudo haberlo escrito)"""
+        snapshot = load_snapshot(self.path)
+        if snapshot is None or snapshot['version'] != version:
+            return None
+        return snapshot
+
+    def refresh(self):
+        """Reconstruir y reescribir el snapshot incondicionalmente"""
+        connection = get_db_connection()
+        if not connection:
+            return None
+        try:
+            with snapshot_lock(self.path):
+                version = fetch_db_version(connection.cursor())
+                snapshot = self.build(connection, version)
+        finally:
+            connection.close()
+
+        with self.lock:
+            self.snapshot = snapshot
+            self.checked_at = time.monotonic()
+        return snapshot
+
+    def build(self, connection, version):
+        """Construir desde la base de datos; la versión se lee antes que los datos"""
+        routes_list = fetch_all_routes(connection.cursor(cursor_factory=RealDictCursor))
+        with app.app_context():
+            payload = all_routes_response(routes_list).get_data()
+
+        geometry = RouteGeometry.load(connection.cursor())
+        grid = SegmentGrid(geometry, SNAPSHOT_GRID_RADIUS)
+
+        try:
+            write_snapshot(self.path, version, payload, geometry, grid)
+        except OSError as e:
+            print(f"No se pudo escribir el snapshot de rutas: {e}")
+
+        return {
+            'version': version,
+            'payload': payload,
+            'geometry': geometry,
+            'grid': grid
+        }
+
+route_cache = RouteSnapshotCache(SNAPSHOT_PATH, SNAPSHOT_MAX_AGE)
+
+class RouteGeometryCache:
+    """Geometría de las rutas activas e índices espaciales en memoria del proceso
+
+    No depende del snapshot en disco: si está habilitado se reutiliza su
+    geometría, si no se carga desde la base de datos. La versión se verifica
+    como máximo cada GEOMETRY_CACHE_MAX_AGE segundos y tras cada escritura del
+    proceso, y solo se recarga si cambió. Hay un índice por radio de
+    MATCH_GRID_RADII, construido en el primer uso
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.version = None
+        self.geometry = None
+        self.grids = {}
+        self.loaded_at = 0.0
+
+    def invalidate(self):
+        """Forzar la verificación de versión en el próximo uso"""
+        self.loaded_at = 0.0
+
+    def get(self, max_distance):
+        """Geometría y un índice de radio >= max_distance, o (None, None) sin conexión"""
+        radius = next(radius for radius in MATCH_GRID_RADII if radius >= max_distance)
+
+        with self.lock:
+            snapshot = route_cache.get()
+            if snapshot:
+                if self.geometry is not snapshot['geometry']:
+                    self.version = snapshot['version']
+                    self.geometry = snapshot['geometry']
+                    self.grids = {snapshot['grid'].radius: snapshot['grid']}
+            elif self.geometry is None or time.monotonic() - self.loaded_at >= self.max_age:
+                connection = get_db_connection()
+                if not connection:
+                    # Sin base de datos se sigue usando la geometría ya cargada
+                    if self.geometry is None:
+                        return None, None
+                    self.loaded_at = time.monotonic()
+                    return self.geometry, self.grid(radius)
+                try:
+                    cursor = connection.cursor()
+                    version = fetch_db_version(cursor)
+                    if self.geometry is None or self.version != version:
+                        self.geometry = RouteGeometry.load(cursor)
+                        self.version = version
+                        self.grids = {}
+                finally:
+                    connection.close()
+                self.loaded_at = time.monotonic()
+
+            return self.geometry, self.grid(radius)
+
+    def grid(self, radius):
+        """Índice espacial de la geometría actual para ``radius`` (llamar con el bloqueo tomado)"""
+        if radius not in self.grids:
+            self.grids[radius] = SegmentGrid(self.geometry, radius)
+        return self.grids[radius]
+
+geometry_cache = RouteGeometryCache(GEOMETRY_CACHE_MAX_AGE)
+
 @app.route('/api/routes', methods=['GET'])
+@coalesce_reads
 def get_all_routes():
     """Obtener todas las rutas con sus coordenadas"""
     try:
+        snapshot = route_cache.get()
+        if snapshot:
+            return app.response_class(bytes(snapshot['payload']), mimetype='application/json')
+
         connection = get_db_connection()
         if not connection:
             return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
         cursor = connection.cursor(cursor_factory=RealDictCursor)
-
-        # Usando la vista route_details que ya tienes creada
-        query = """
-        SELECT
-            id,
-            name,
-            description,
-            route_type,
-            is_active,
-            coordinates
-        FROM route_details
-        ORDER BY name
-        """
-
-        cursor.execute(query)
-        routes = cursor.fetchall()
-
-        # Convertir RealDictRow a diccionario normal
-        routes_list = []
-        for route in routes:
-            route_dict = dict(route)
-            # Las coordenadas ya vienen como JSON desde la vista
-            routes_list.append(route_dict)
+        routes_list = fetch_all_routes(cursor)
 
         cursor.close()
         connection.close()
 
-        return jsonify({
-            'success': True,
-            'data': routes_list,
-            'total': len(routes_list)
-        })
+        return all_routes_response(routes_list)
 
     except Error as e:
         return jsonify({'error': f'Error de base de datos: {str(e)}'}), 500
@@ -88,6 +333,7 @@ def get_all_routes():
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 @app.route('/api/routes/<route_name>', methods=['GET'])
+@coalesce_reads
 def get_route_by_name(route_name):
     """Obtener una ruta específica por nombre"""
     try:
@@ -133,6 +379,7 @@ def get_route_by_name(route_name):
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 @app.route('/api/routes/<int:route_id>', methods=['GET'])
+@coalesce_reads
 def get_route_by_id(route_id):
     """Obtener una ruta específica por ID"""
     try:
@@ -231,7 +478,7 @@ def create_route():
                 coord_values = (route_id, coord['lat'], coord['lng'], i)
                 cursor.execute(coordinates_query, coord_values)
 
-            connection.commit()
+            commit_write(connection)
             cursor.close()
             connection.close()
 
@@ -327,7 +574,7 @@ def update_route(route_id):
                     coord_values = (route_id, coord['lat'], coord['lng'], i)
                     cursor.execute(coordinates_query, coord_values)
 
-            connection.commit()
+            commit_write(connection)
             cursor.close()
             connection.close()
 
@@ -375,7 +622,7 @@ def delete_route(route_id):
         update_query = "UPDATE routes SET is_active = FALSE WHERE id = %s"
         cursor.execute(update_query, (route_id,))
 
-        connection.commit()
+        commit_write(connection)
         cursor.close()
         connection.close()
 
@@ -389,7 +636,280 @@ def delete_route(route_id):
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
+def is_route_id(value):
+    """Los booleanos de JSON también son int en Python y no son ids válidos"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_bulk_routes(items):
+    """Validar los elementos de una operación masiva, devuelve lista de errores por elemento"""
+    valid_route_types = ['bus', 'trufi', 'micro']
+    errors = []
+    seen_ids = set()
+    seen_names = set()
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'error': 'El elemento debe ser un objeto'})
+            continue
+
+        route_id = item.get('id')
+        name = item.get('name')
+
+        if route_id is None and 'name' not in item:
+            errors.append({'index': index, 'error': 'Campo requerido: id o name'})
+            continue
+        if route_id is not None and not is_route_id(route_id):
+            errors.append({'index': index, 'error': 'El id debe ser un entero'})
+            continue
+        if 'name' in item and (not isinstance(name, str) or not name):
+            errors.append({'index': index, 'error': 'El nombre debe ser un texto no vacío'})
+            continue
+        if 'description' in item and item['description'] is not None and not isinstance(item['description'], str):
+            errors.append({'index': index, 'error': 'La descripción debe ser un texto'})
+            continue
+        if 'is_active' in item and not isinstance(item['is_active'], bool):
+            errors.append({'index': index, 'error': 'is_active debe ser booleano'})
+            continue
+
+        if route_id is not None:
+            if route_id in seen_ids:
+                errors.append({'index': index, 'error': f'Id duplicado en la solicitud: {route_id}'})
+                continue
+            seen_ids.add(route_id)
+        if name:
+            if name in seen_names:
+                errors.append({'index': index, 'error': f'Nombre duplicado en la solicitud: {name}'})
+                continue
+            seen_names.add(name)
+
+        if 'route_type' in item and item['route_type'] not in valid_route_types:
+            errors.append({'index': index, 'error': f'Tipo de ruta inválido. Debe ser uno de: {valid_route_types}'})
+            continue
+
+        if 'coordinates' in item:
+            coordinates = item['coordinates']
+            if not isinstance(coordinates, list) or not all(
+                isinstance(coord, dict) and is_number(coord.get('lat')) and is_number(coord.get('lng'))
+                for coord in coordinates
+            ):
+                errors.append({'index': index, 'error': 'Las coordenadas deben ser una lista de objetos con lat/lng numéricos'})
+                continue
+
+    return errors
+
+@app.route('/api/routes/bulk', methods=['POST'])
+def bulk_upsert_routes():
+    """Crear o actualizar muchas rutas en una sola transacción"""
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, dict) or not isinstance(data.get('routes'), list) or not data['routes']:
+            return jsonify({'error': 'Campo requerido: routes (lista no vacía)'}), 400
+
+        items = data['routes']
+        errors = validate_bulk_routes(items)
+        if errors:
+            return jsonify({'error': 'Datos inválidos en la solicitud', 'details': errors}), 400
+
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+        try:
+            cursor = connection.cursor()
+
+            # Cada campo viaja con un indicador de si fue enviado; los no enviados
+            # conservan el valor que tenga la fila al momento de escribirla
+            fields = ['name', 'description', 'route_type', 'is_active']
+            results = [None] * len(items)
+            update_rows = []
+            insert_rows = []
+
+            for index, item in enumerate(items):
+                flagged = []
+                for field in fields:
+                    flagged.extend([field in item, item.get(field)])
+                if item.get('id') is not None:
+                    update_rows.append((index, item['id'], *flagged))
+                else:
+                    insert_rows.append((index, item['name'], *flagged[2:]))
+
+            update_query = """
+            UPDATE routes AS r
+            SET name = CASE WHEN d.set_name THEN d.name::text ELSE r.name END,
+                description = CASE WHEN d.set_description THEN d.description::text ELSE r.description END,
+                route_type = CASE WHEN d.set_route_type THEN d.route_type::route_type_enum ELSE r.route_type END,
+                is_active = CASE WHEN d.set_is_active THEN d.is_active::boolean ELSE r.is_active END
+            FROM (VALUES %s) AS d (idx, id, set_name, name, set_description, description,
+                                   set_route_type, route_type, set_is_active, is_active)
+            WHERE {match}
+            RETURNING d.idx, r.id, r.name
+            """
+
+            def apply_updates(rows, match):
+                if not rows:
+                    return
+                updated = execute_values(
+                    cursor,
+                    update_query.format(match=match),
+                    rows,
+                    page_size=len(rows),
+                    fetch=True
+                )
+                for index, route_id, name in updated:
+                    results[index] = {'index': index, 'id': route_id, 'name': name, 'status': 'updated'}
+                for row in rows:
+                    if results[row[0]] is None:
+                        results[row[0]] = {'index': row[0], 'id': row[1], 'status': 'not_found'}
+
+            # Primero los cambios por id, así un nombre que el lote libera al renombrar
+            # puede usarse para crear una ruta nueva
+            apply_updates(update_rows, 'r.id = d.id::integer')
+
+            if insert_rows:
+                inserted = execute_values(
+                    cursor,
+                    """
+                    INSERT INTO routes (name, description, route_type, is_active)
+                    SELECT
+                        d.name,
+                        CASE WHEN d.set_description THEN d.description::text ELSE '' END,
+                        CASE WHEN d.set_route_type THEN d.route_type::route_type_enum ELSE 'bus' END,
+                        CASE WHEN d.set_is_active THEN d.is_active::boolean ELSE TRUE END
+                    FROM (VALUES %s) AS d (idx, name, set_description, description,
+                                           set_route_type, route_type, set_is_active, is_active)
+                    ORDER BY d.idx
+                    ON CONFLICT (name) DO NOTHING
+                    RETURNING id, name
+                    """,
+                    insert_rows,
+                    page_size=len(insert_rows),
+                    fetch=True
+                )
+                index_by_name = {row[1]: row[0] for row in insert_rows}
+                for route_id, name in inserted:
+                    index = index_by_name[name]
+                    results[index] = {'index': index, 'id': route_id, 'name': name, 'status': 'created'}
+
+            # Los elementos por nombre que ya existían solo cambian los campos enviados
+            apply_updates([
+                (row[0], None, False, row[1], *row[2:])
+                for row in insert_rows if results[row[0]] is None
+            ], 'r.name = d.name::text')
+
+            # Reemplazar las coordenadas de todas las rutas que las enviaron
+            coordinate_routes = {}
+            for index, item in enumerate(items):
+                if 'coordinates' in item and results[index]['status'] != 'not_found':
+                    coordinate_routes[results[index]['id']] = item['coordinates']
+
+            if coordinate_routes:
+                cursor.execute(
+                    "DELETE FROM route_coordinates WHERE route_id = ANY(%s)",
+                    (list(coordinate_routes),)
+                )
+                coordinate_rows = [
+                    (route_id, coord['lat'], coord['lng'], i)
+                    for route_id, coordinates in coordinate_routes.items()
+                    for i, coord in enumerate(coordinates, 1)
+                ]
+                if coordinate_rows:
+                    execute_values(
+                        cursor,
+                        """
+                        INSERT INTO route_coordinates (route_id, latitude, longitude, sequence_order)
+                        VALUES %s
+                        """,
+                        coordinate_rows,
+                        page_size=1000
+                    )
+
+            commit_write(connection)
+            cursor.close()
+            connection.close()
+
+            return jsonify({
+                'success': True,
+                'message': 'Operación masiva completada',
+                'data': results,
+                'created': sum(1 for result in results if result['status'] == 'created'),
+                'updated': sum(1 for result in results if result['status'] == 'updated'),
+                'not_found': sum(1 for result in results if result['status'] == 'not_found')
+            })
+
+        except psycopg2.IntegrityError as e:
+            connection.rollback()
+            cursor.close()
+            connection.close()
+            return jsonify({'error': 'Conflicto de datos (posible nombre duplicado)'}), 409
+
+    except Error as e:
+        if 'connection' in locals():
+            connection.rollback()
+            connection.close()
+        return jsonify({'error': f'Error de base de datos: {str(e)}'}), 500
+    except Exception as e:
+        if 'connection' in locals():
+            connection.rollback()
+            connection.close()
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@app.route('/api/routes/bulk/deactivate', methods=['POST'])
+def bulk_deactivate_routes():
+    """Desactivar muchas rutas en una sola transacción (soft delete masivo)"""
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, dict) or not isinstance(data.get('ids'), list) or not data['ids']:
+            return jsonify({'error': 'Campo requerido: ids (lista no vacía)'}), 400
+
+        ids = data['ids']
+        if not all(is_route_id(route_id) for route_id in ids):
+            return jsonify({'error': 'Todos los ids deben ser enteros'}), 400
+
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+        cursor = connection.cursor()
+
+        update_query = "UPDATE routes SET is_active = FALSE WHERE id = ANY(%s) RETURNING id"
+        cursor.execute(update_query, (ids,))
+        deactivated = {row[0] for row in cursor.fetchall()}
+
+        commit_write(connection)
+        cursor.close()
+        connection.close()
+
+        results = [
+            {'id': route_id, 'status': 'deactivated' if route_id in deactivated else 'not_found'}
+            for route_id in ids
+        ]
+
+        return jsonify({
+            'success': True,
+            'message': 'Rutas desactivadas exitosamente',
+            'data': results,
+            'deactivated': len(deactivated),
+            'not_found': sum(1 for result in results if result['status'] == 'not_found')
+        })
+
+    except Error as e:
+        if 'connection' in locals():
+            connection.rollback()
+            connection.close()
+        return jsonify({'error': f'Error de base de datos: {str(e)}'}), 500
+    except Exception as e:
+        if 'connection' in locals():
+            connection.rollback()
+            connection.close()
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
 @app.route('/api/routes/type/<route_type>', methods=['GET'])
+@coalesce_reads
 def get_routes_by_type(route_type):
     """Obtener rutas por tipo (bus, trufi, micro)"""
     try:
@@ -441,6 +961,7 @@ def get_routes_by_type(route_type):
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 @app.route('/api/routes/search', methods=['GET'])
+@coalesce_reads
 def search_routes():
     """Buscar rutas por nombre o descripción"""
     try:
@@ -492,6 +1013,7 @@ def search_routes():
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 @app.route('/api/routes/stats', methods=['GET'])
+@coalesce_reads
 def get_routes_stats():
     """Obtener estadísticas de las rutas"""
     try:
@@ -543,6 +1065,182 @@ def get_routes_stats():
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
+def build_overlap_report(cursor, tolerance=20, corridor_size=200, min_shared=100, limit=50):
+    """Calcular solapamiento entre pares de rutas activas y rutas por corredor
+
+    Lanza ValueError si algún parámetro está fuera de rango. Debe recibir un
+    cursor sin transacción en curso: las rutas y su geometría se leen en una
+    misma transacción REPEATABLE READ para que ambas vean los mismos datos
+    """
+    if not 1 <= tolerance <= 200:
+        raise ValueError('tolerance debe estar entre 1 y 200 metros')
+    if not 20 <= corridor_size <= 5000:
+        raise ValueError('corridor_size debe estar entre 20 y 5000 metros')
+    if limit < 0:
+        raise ValueError('limit no puede ser negativo')
+
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+    cursor.execute("SELECT id, name, route_type FROM routes WHERE is_active = TRUE")
+    routes = {row[0]: {'id': row[0], 'name': row[1], 'route_type': row[2]} for row in cursor.fetchall()}
+
+    geometry = RouteGeometry.load(cursor)
+    route_lengths = geometry.route_lengths
+    route_ids = geometry.route_ids.tolist()
+
+    overlaps = []
+    first, second, shared_first, shared_second = route_overlaps(geometry, tolerance)
+    for i, j, shared_i, shared_j in zip(first.tolist(), second.tolist(), shared_first.tolist(), shared_second.tolist()):
+        if max(shared_i, shared_j) < min_shared:
+            continue
+        overlaps.append({
+            'route_a': routes[route_ids[i]],
+            'route_b': routes[route_ids[j]],
+            'shared_length_a': round(shared_i, 1),
+            'shared_length_b': round(shared_j, 1),
+            'fraction_a': round(shared_i / route_lengths[i], 3) if route_lengths[i] else 0,
+            'fraction_b': round(shared_j / route_lengths[j], 3) if route_lengths[j] else 0
+        })
+    overlaps.sort(key=lambda item: max(item['fraction_a'], item['fraction_b']), reverse=True)
+
+    corridors = []
+    centers, route_count, cell_of_pair, pair_route = corridor_counts(geometry, corridor_size)
+    busiest = np.argsort(route_count, kind='stable')[::-1]
+    busiest = busiest[route_count[busiest] >= 2][:limit]
+    lats, lngs = from_local_xy(centers[busiest], geometry.origin_lat)
+    for cell, lat, lng in zip(busiest.tolist(), lats.tolist(), lngs.tolist()):
+        cell_routes = [routes[route_ids[index]] for index in pair_route[cell_of_pair == cell].tolist()]
+        corridor = {
+            'lat': round(lat, 6),
+            'lng': round(lng, 6),
+            'total_routes': len(cell_routes),
+            'route_ids': [route['id'] for route in cell_routes]
+        }
+        for route_type in ['bus', 'trufi', 'micro']:
+            corridor[f'{route_type}_routes'] = sum(1 for route in cell_routes if route['route_type'] == route_type)
+        corridors.append(corridor)
+
+    return {
+        'tolerance': tolerance,
+        'corridor_size': corridor_size,
+        'overlaps': overlaps,
+        'corridors': corridors
+    }
+
+@app.route('/api/routes/overlap', methods=['GET'])
+@coalesce_reads
+def get_routes_overlap():
+    """Analizar qué rutas activas comparten recorrido y los corredores más cargados"""
+    try:
+        try:
+            tolerance = float(request.args.get('tolerance', 20))
+            corridor_size = float(request.args.get('corridor_size', 200))
+            min_shared = float(request.args.get('min_shared', 100))
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            return jsonify({'error': 'Parámetros numéricos inválidos'}), 400
+
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+        cursor = connection.cursor()
+        try:
+            report = build_overlap_report(cursor, tolerance, corridor_size, min_shared, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        finally:
+            cursor.close()
+            connection.close()
+
+        return jsonify({
+            'success': True,
+            'data': report
+        })
+
+    except Error as e:
+        return jsonify({'error': f'Error de base de datos: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@app.route('/api/match', methods=['POST'])
+def match_gps_points():
+    """Ajustar un lote de puntos GPS de vehículos a las rutas más cercanas"""
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, dict) or not isinstance(data.get('points'), list) or not data['points']:
+            return jsonify({'error': 'Campo requerido: points (lista no vacía)'}), 400
+
+        points = data['points']
+        for index, point in enumerate(points):
+            if (
+                not isinstance(point, dict)
+                or not is_number(point.get('lat')) or not -90 <= point['lat'] <= 90
+                or not is_number(point.get('lng')) or not -180 <= point['lng'] <= 180
+            ):
+                return jsonify({'error': f'Punto {index}: lat debe estar entre -90 y 90 y lng entre -180 y 180'}), 400
+
+        lats = np.array([point['lat'] for point in points], dtype=np.float64)
+        lngs = np.array([point['lng'] for point in points], dtype=np.float64)
+
+        max_distance = data.get('max_distance', 50)
+        if not is_number(max_distance) or not 0 < max_distance <= 1000:
+            return jsonify({'error': 'max_distance debe estar entre 0 y 1000 metros'}), 400
+
+        route_ids = data.get('route_ids')
+        if route_ids is not None and (
+            not isinstance(route_ids, list) or not route_ids or not all(is_route_id(route_id) for route_id in route_ids)
+        ):
+            return jsonify({'error': 'route_ids debe ser una lista no vacía de enteros'}), 400
+
+        geometry, grid = geometry_cache.get(max_distance)
+        if geometry is None:
+            return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+        # Filtrar por ruta sobre la geometría en memoria, sin otra consulta ni otro índice
+        route_mask = np.isin(geometry.route_ids, route_ids) if route_ids is not None else None
+
+        route_index, distance_to_route, distance_along = match_points(geometry, lats, lngs, max_distance, grid, route_mask)
+
+        results = []
+        for index, point in enumerate(points):
+            matched = route_index[index] >= 0
+            results.append({
+                'index': index,
+                'timestamp': point.get('timestamp'),
+                'route_id': int(geometry.route_ids[route_index[index]]) if matched else None,
+                'distance_along_route': round(float(distance_along[index]), 1) if matched else None,
+                'distance_to_route': round(float(distance_to_route[index]), 1) if matched else None
+            })
+
+        # La ruta del vehículo es la que acumula más puntos ajustados
+        votes = np.bincount(route_index[route_index >= 0], minlength=len(geometry.route_ids))
+        best_route_id = int(geometry.route_ids[np.argmax(votes)]) if votes.any() else None
+
+        return jsonify({
+            'success': True,
+            'data': results,
+            'total': len(results),
+            'matched': int((route_index >= 0).sum()),
+            'best_route_id': best_route_id
+        })
+
+    except Error as e:
+        return jsonify({'error': f'Error de base de datos: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas del proceso: lecturas ejecutadas y agrupadas por endpoint"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'coalescing': read_flights.snapshot()
+        },
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Verificar el estado de la API"""
@@ -587,3 +1285,7 @@ def method_not_allowed(error):
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Error interno del servidor'}), 500
+
+# Arranque en caliente: con gunicorn --preload el snapshot se mapea una vez en el
+# proceso maestro y los workers comparten sus páginas de solo lectura
+route_cache.warm_up()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Reporte de solapamiento de rutas
+Muestra qué rutas activas comparten recorrido y los corredores con más rutas.
+Usa las mismas variables de entorno DB_* que la API.
+
+    python overlap_report.py --tolerance 20 --corridor-size 200
+    python overlap_report.py --json > solapamiento.json
+"""
+
+import argparse
+import json
+import sys
+
+from main import get_db_connection, build_overlap_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analizar solapamiento entre rutas activas')
+    parser.add_argument('--tolerance', type=float, default=20, help='Distancia máxima en metros para considerar recorrido compartido')
+    parser.add_argument('--corridor-size', type=float, default=200, help='Tamaño en metros de cada celda de corredor')
+    parser.add_argument('--min-shared', type=float, default=100, help='Metros compartidos mínimos para listar un par de rutas')
+    parser.add_argument('--limit', type=int, default=20, help='Cantidad de corredores a mostrar')
+    parser.add_argument('--json', action='store_true', help='Imprimir el reporte completo en JSON')
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    if not connection:
+        print("❌ No se pudo conectar a la base de datos")
+        sys.exit(1)
+
+    cursor = connection.cursor()
+    try:
+        report = build_overlap_report(cursor, args.tolerance, args.corridor_size, args.min_shared, args.limit)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        connection.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"🔀 Pares de rutas con recorrido compartido (tolerancia {args.tolerance:g} m): {len(report['overlaps'])}")
+    for item in report['overlaps']:
+        a, b = item['route_a'], item['route_b']
+        print(f"   {a['name']} ({a['route_type']}) ↔ {b['name']} ({b['route_type']}): "
+              f"{item['shared_length_a']:.0f} m ({item['fraction_a']:.0%}) / "
+              f"{item['shared_length_b']:.0f} m ({item['fraction_b']:.0%})")
+
+    print()
+    print(f"🛣️  Corredores con más rutas (celdas de {args.corridor_size:g} m):")
+    for corridor in report['corridors']:
+        print(f"   ({corridor['lat']:.6f}, {corridor['lng']:.6f}): {corridor['total_routes']} rutas "
+              f"[bus {corridor['bus_routes']}, trufi {corridor['trufi_routes']}, micro {corridor['micro_routes']}]")
+
+
+if __name__ == '__main__':
+    main()
@@ -56,6 +56,39 @@ CREATE TABLE route_coordinates (
 -- Create indexes
 CREATE INDEX idx_route_sequence ON route_coordinates(route_id, sequence_order);
 
+-- --------------------------------------------------------
+-- Table structure for table "routes_version"
+-- --------------------------------------------------------
+
+-- Versión de los datos de rutas (una sola fila); la API la compara con la del
+-- snapshot en disco sin recorrer routes ni route_coordinates
+CREATE TABLE routes_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO routes_version DEFAULT VALUES;
+
+-- Create function to bump the routes version
+CREATE OR REPLACE FUNCTION bump_routes_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE routes_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Create triggers: one bump per statement that modifies routes or coordinates
+CREATE TRIGGER bump_routes_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON routes
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_routes_version();
+
+CREATE TRIGGER bump_route_coordinates_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON route_coordinates
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_routes_version();
+
 -- --------------------------------------------------------
 -- Insert data for table "routes"
 -- --------------------------------------------------------
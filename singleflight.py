@@ -0,0 +1,66 @@
+"""
+Agrupación de solicitudes idénticas en curso (single-flight)
+Si varias solicitudes con la misma clave llegan mientras la primera todavía
+se está ejecutando, solo esa se ejecuta y las demás esperan y comparten su
+resultado
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {}
+
+    def do(self, group, key, fn):
+        """Ejecutar fn una sola vez por clave en curso y compartir el resultado"""
+        with self.lock:
+            stats = self.stats.setdefault(group, {'executed': 0, 'coalesced': 0})
+            call = self.calls.get((group, key))
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[(group, key)] = call
+                stats['executed'] += 1
+            else:
+                stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[(group, key)]
+            call.done.set()
+
+        return call.result
+
+    def snapshot(self):
+        """Copia de los contadores por grupo y totales"""
+        with self.lock:
+            groups = {group: dict(stats) for group, stats in self.stats.items()}
+            in_flight = len(self.calls)
+
+        return {
+            'endpoints': groups,
+            'executed': sum(stats['executed'] for stats in groups.values()),
+            'coalesced': sum(stats['coalesced'] for stats in groups.values()),
+            'in_flight': in_flight
+        }
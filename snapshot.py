@@ -0,0 +1,152 @@
+"""
+Snapshot en disco de las rutas para arranque en caliente
+Un solo archivo con una cabecera JSON seguida de bloques binarios alineados:
+la respuesta serializada de GET /api/routes y los arreglos NumPy de la
+geometría y del índice espacial. Se abre con mmap en modo solo lectura, así
+los workers de Gunicorn creados con --preload comparten las mismas páginas
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from geometry import RouteGeometry, SegmentGrid
+
+SNAPSHOT_MAGIC = b'RUTASNP1'
+SNAPSHOT_ALIGN = 64
+
+# Contador que incrementan los triggers de routes y route_coordinates (postgresql.sql).
+# La actualización bloquea su única fila, así cada transacción que escribe confirma
+# un valor distinto y mayor que el anterior, sin importar en qué orden empezaron
+DB_VERSION_QUERY = "SELECT version FROM routes_version"
+
+GEOMETRY_ARRAYS = ['route_ids', 'seg_route', 'start', 'end', 'offset']
+GRID_ARRAYS = ['keys', 'segments', 'grid_min', 'grid_shape']
+
+
+def fetch_db_version(cursor):
+    """Versión actual de los datos de rutas (lectura de una sola fila)"""
+    cursor.execute(DB_VERSION_QUERY)
+    return str(cursor.fetchone()[0])
+
+
+@contextmanager
+def snapshot_lock(path):
+    """Bloqueo exclusivo entre procesos (flock sobre <path>.lock) para reconstruir el snapshot"""
+    try:
+        handle = open(f'{path}.lock', 'a')
+    except OSError as e:
+        # Sin archivo de bloqueo se reconstruye igual, como antes de usarlo
+        print(f"No se pudo abrir el bloqueo del snapshot: {e}")
+        yield
+        return
+
+    with handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _align(position):
+    return (position + SNAPSHOT_ALIGN - 1) // SNAPSHOT_ALIGN * SNAPSHOT_ALIGN
+
+
+def write_snapshot(path, version, payload, geometry, grid):
+    """Escribir el snapshot de forma atómica (archivo temporal + os.replace)"""
+    blocks = {'payload': payload}
+    for name in GEOMETRY_ARRAYS:
+        blocks[f'geometry.{name}'] = np.ascontiguousarray(getattr(geometry, name))
+    for name in GRID_ARRAYS:
+        blocks[f'grid.{name}'] = np.ascontiguousarray(getattr(grid, name))
+
+    header = {
+        'version': version,
+        'origin_lat': geometry.origin_lat,
+        'grid_radius': grid.radius,
+        'grid_cell_size': grid.cell_size,
+        'blocks': {}
+    }
+
+    # Calcular posiciones relativas al final de la cabecera
+    position = 0
+    for name, block in blocks.items():
+        position = _align(position)
+        if isinstance(block, np.ndarray):
+            header['blocks'][name] = {'offset': position, 'dtype': block.dtype.str, 'shape': list(block.shape)}
+            position += block.nbytes
+        else:
+            header['blocks'][name] = {'offset': position, 'length': len(block)}
+            position += len(block)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(descriptor, 'wb') as handle:
+            handle.write(SNAPSHOT_MAGIC)
+            handle.write(len(header_bytes).to_bytes(8, 'little'))
+            handle.write(header_bytes)
+            for name, block in blocks.items():
+                handle.seek(data_start + header['blocks'][name]['offset'])
+                handle.write(block.tobytes() if isinstance(block, np.ndarray) else block)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+def load_snapshot(path):
+    """Mapear el snapshot en memoria; devuelve None si no existe o no es válido"""
+    try:
+        with open(path, 'rb') as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            return None
+        header_length = int.from_bytes(mapped[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 8], 'little')
+        header_start = len(SNAPSHOT_MAGIC) + 8
+        header = json.loads(mapped[header_start:header_start + header_length].decode('utf-8'))
+        data_start = _align(header_start + header_length)
+
+        def array(name):
+            block = header['blocks'][name]
+            dtype = np.dtype(block['dtype'])
+            count = int(np.prod(block['shape']))
+            values = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + block['offset'])
+            return values.reshape(block['shape'])
+
+        geometry = RouteGeometry(
+            *(array(f'geometry.{name}') for name in GEOMETRY_ARRAYS),
+            header['origin_lat']
+        )
+        grid = SegmentGrid.from_arrays(
+            header['grid_radius'],
+            header['grid_cell_size'],
+            *(array(f'grid.{name}') for name in GRID_ARRAYS)
+        )
+
+        payload_block = header['blocks']['payload']
+        payload_start = data_start + payload_block['offset']
+        payload = memoryview(mapped)[payload_start:payload_start + payload_block['length']]
+    except (KeyError, ValueError, TypeError):
+        return None
+
+    return {
+        'version': header['version'],
+        'payload': payload,
+        'geometry': geometry,
+        'grid': grid
+    }
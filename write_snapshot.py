@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Escritura periódica del snapshot de rutas
+Reconstruye el archivo ROUTE_SNAPSHOT_PATH desde la base de datos para que
+los workers que arrancan después lo mapeen sin consultar PostgreSQL.
+Usa las mismas variables de entorno DB_* que la API.
+
+    python write_snapshot.py                 # una sola vez
+    python write_snapshot.py --interval 300  # cada 5 minutos
+"""
+
+import argparse
+import sys
+import time
+
+from main import route_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Escribir el snapshot de rutas en disco')
+    parser.add_argument('--interval', type=float, default=0, help='Segundos entre escrituras (0 = una sola vez)')
+    args = parser.parse_args()
+
+    if not route_cache.path:
+        print("❌ Define ROUTE_SNAPSHOT_PATH con la ruta del archivo de snapshot")
+        sys.exit(1)
+
+    while True:
+        snapshot = route_cache.refresh()
+        if snapshot:
+            print(f"✅ Snapshot escrito en {route_cache.path} (versión {snapshot['version']})")
+        else:
+            print("❌ No se pudo conectar a la base de datos")
+            if not args.interval:
+                sys.exit(1)
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()